@@ -1,12 +1,42 @@
+import email.utils
+import functools
+import itertools
+import json
 import logging
+import os
+import random
 import requests
+import sqlite3
+import threading
 import time
 import types
 import urllib3
 import warnings
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from enum import Enum
-from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, urljoin, urlparse
+from urllib3.util.retry import Retry
+
+# orjson is considerably faster than the standard library when decoding
+# large responses (e.g. expanded job collections), but it is optional.
+try:
+    from orjson import dumps as json_dumps
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode()
+
+# ijson lets us filter large collections while they are being parsed,
+# rather than decoding the whole response first. It is optional.
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 # It is common from management controllers to have vendor-provided
 # self-signed certificates. We don't need a warning every time we
@@ -17,12 +47,53 @@ warnings.filterwarnings(
 
 LOG = logging.getLogger(__name__)
 
-MODULE_COMMON_ARGS = dict(
-    host=dict(type='str', required=True),
-    username=dict(type='str', required=True),
-    password=dict(type='str', required=True, no_log=True),
-    verify=dict(type='bool', default=True),
-)
+# Request timeouts (in seconds). We fail quickly if we can't
+# connect at all; the read timeout may be overridden by passing
+# timeout to IDRAC.
+CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 60
+
+# Polling intervals (in seconds) used by the wait_for_* methods. The
+# delay starts at POLL_MIN_DELAY and doubles after every unsuccessful
+# poll until it reaches POLL_MAX_DELAY.
+POLL_MIN_DELAY = 0.5
+POLL_MAX_DELAY = 30
+
+# Up to this fraction of the delay is added at random to each poll
+# interval, so that many clients waiting on the same iDRAC don't poll
+# in lockstep.
+POLL_JITTER = 0.1
+
+# Ask the iDRAC to hold a poll for up to this many seconds until the
+# resource changes (RFC 7240 "Prefer: wait"). Firmware that doesn't
+# support this simply ignores the header.
+LONG_POLL_WAIT = 30
+
+# Connection pool settings. We only ever talk to a single iDRAC, but
+# a larger pool lets concurrent requests each reuse an established
+# connection instead of paying for a new TLS handshake.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# The maximum number of requests we will have in flight at once when
+# fetching many resources (e.g. the members of a collection). Some
+# older iDRACs only permit a few concurrent Redfish requests, so this
+# may be overridden with the IDRAC_MAX_CONCURRENCY environment variable.
+try:
+    DEFAULT_MAX_WORKERS = int(os.environ['IDRAC_MAX_CONCURRENCY'])
+except (KeyError, ValueError):
+    DEFAULT_MAX_WORKERS = 8
+
+# Query used to ask the iDRAC to inline the members of a collection
+# rather than returning only their URIs.
+EXPAND_QUERY = '$expand=*($levels=1)'
+
+# Action descriptors list the permitted values of each parameter
+# in a key named <parameter><ALLOWABLE_VALUES_SUFFIX>.
+ALLOWABLE_VALUES_SUFFIX = '@Redfish.AllowableValues'
+
+# Where we persist Redfish resources between module invocations.
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.cache/moc-idrac')
 
 
 class JOB_STATE(Enum):
@@ -33,12 +104,49 @@ class JOB_STATE(Enum):
     failed = 10
 
 
+# Maps the Message of a job to its state. Messages that don't appear
+# here are checked for the word 'failed' by IDRAC.get_job_state.
+_STATE_TABLE = {
+    'Task successfully scheduled.': JOB_STATE.scheduled,
+    'Job in progress.': JOB_STATE.running,
+    'Job completed successfully.': JOB_STATE.finished,
+}
+
+# Maps the JobState of a job to its state, for jobs whose Message
+# isn't recognized.
+_JOBSTATE_TABLE = {
+    'New': JOB_STATE.scheduled,
+    'Scheduling': JOB_STATE.scheduled,
+    'Scheduled': JOB_STATE.scheduled,
+    'Downloading': JOB_STATE.scheduled,
+    'Downloaded': JOB_STATE.scheduled,
+    'Waiting': JOB_STATE.scheduled,
+    'ReadyForExecution': JOB_STATE.scheduled,
+    'Pending': JOB_STATE.scheduled,
+    'Starting': JOB_STATE.scheduled,
+    'RebootPending': JOB_STATE.scheduled,
+    'PendingActivation': JOB_STATE.scheduled,
+    'Running': JOB_STATE.running,
+    'RebootCompleted': JOB_STATE.running,
+    'Completed': JOB_STATE.finished,
+    'Failed': JOB_STATE.failed,
+    'CompletedWithErrors': JOB_STATE.failed,
+    'RebootFailed': JOB_STATE.failed,
+    'Exception': JOB_STATE.failed,
+}
+
+# Jobs in these states will not change state again.
+TERMINAL_JOB_STATES = frozenset((JOB_STATE.finished, JOB_STATE.failed))
+
+
 class RESOURCES(types.SimpleNamespace):
     system = '/redfish/v1/Systems/System.Embedded.1'
     manager = '/redfish/v1/Managers/iDRAC.Embedded.1'
     storage = '/redfish/v1/Systems/System.Embedded.1/Storage'
     jobs = '/redfish/v1/Managers/iDRAC.Embedded.1/Jobs'
     disks = '/redfish/v1/Systems/System.Embedded.1/Storage/Volumes'
+    events = '/redfish/v1/EventService'
+    sessions = '/redfish/v1/SessionService/Sessions'
 
 
 class IDRACError(Exception):
@@ -66,7 +174,7 @@ class OperationFailed(IDRACError):
         self.response = exc.response
 
         if exc.response and exc.response.text:
-            data = exc.response.json()
+            data = json_loads(exc.response.content)
         else:
             data = {}
 
@@ -91,25 +199,364 @@ class CommunicationFailure(OperationFailed):
     pass
 
 
+class RequestTimeout(CommunicationFailure):
+    '''The iDRAC did not respond to a request in time.
+
+    This is deliberately not a TimeoutError: that means a wait_for_*
+    method ran out of time, and callers (e.g. power_cycle_system) act
+    on it. The wait_for_* methods retry requests that time out until
+    their own deadline passes.
+    '''
+
+    pass
+
+
 class JobSchedulingFailed(IDRACError):
     '''Failed to get job ID when scheduling a job'''
     pass
 
 
+class UnexpectedJobState(IDRACError):
+    '''A job we were waiting on finished in a different state.
+
+    The 'job' attribute contains the job resource.
+    '''
+
+    def __init__(self, job, state):
+        self.job = job
+        self.state = state
+        super().__init__('job {} is {}'.format(job.get('Id'), state.name))
+
+
+def parse_retry_after(value):
+    '''Return the number of seconds requested by a Retry-After header.
+
+    The header may contain either a number of seconds or an HTTP date.
+    Returns None if the value is missing or cannot be parsed.
+    '''
+
+    if not value:
+        return None
+
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+
+    return max(0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def default_cache_path(host):
+    '''Return the path of the on-disk resource cache for host'''
+    return os.path.join(DEFAULT_CACHE_DIR, '{}.db'.format(host))
+
+
+def job_state_filter(states):
+    '''Return a $filter expression selecting jobs in the given states.
+
+    The expression selects every job that IDRAC.get_job_state would
+    place in one of the states (and possibly others), so the result
+    still has to be filtered by the caller. Returns None if states is
+    empty or None, or if that isn't possible: jobs are failed whenever
+    their Message mentions failure, which Redfish's $filter cannot
+    express, and unknown jobs are simply those we don't recognize.
+    '''
+
+    if not states or JOB_STATE.unknown in states or \
+            JOB_STATE.failed in states:
+        return None
+
+    terms = ["Message eq '{}'".format(msg)
+             for msg, state in _STATE_TABLE.items()
+             if state in states]
+    terms.extend("JobState eq '{}'".format(jobstate)
+                 for jobstate, state in _JOBSTATE_TABLE.items()
+                 if state in states)
+
+    return ' or '.join(terms)
+
+
+@functools.lru_cache(maxsize=64)
+def _encode_action_body(params):
+    '''Return the JSON body for an action.
+
+    params is a sorted tuple of (name, value) pairs, so that it can be
+    used as a cache key.
+    '''
+    return json_dumps(dict(params))
+
+
+def parse_cache_control(value):
+    '''Parse a Cache-Control header into a dictionary of directives.
+
+    Directives without a value (e.g. no-store) map to None.
+    '''
+
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.partition('=')
+        if name.strip():
+            directives[name.strip().lower()] = arg.strip().strip('"') or None
+
+    return directives
+
+
+class ResourceCache:
+    '''A persistent cache of Redfish resources.
+
+    Each entry stores the body of a resource along with the ETag
+    returned by the iDRAC, so that the entry can be revalidated with
+    a conditional request in a later session, and the time (if any)
+    until which the iDRAC said the resource may be used without
+    revalidation.
+
+    Several iDRACs may share a cache file, and they all use the same
+    Redfish URIs, so entries are keyed by host as well as by uri. A
+    ResourceCache only reads and writes the entries of its own host.
+    '''
+
+    # Increment this when changing the schema; existing caches will
+    # be discarded.
+    SCHEMA_VERSION = 3
+
+    def __init__(self, path, host):
+        self.host = host
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+
+        version = self._db.execute('pragma user_version').fetchone()[0]
+        if version != self.SCHEMA_VERSION:
+            self._db.execute('drop table if exists resources')
+            self._db.execute(
+                'pragma user_version = {:d}'.format(self.SCHEMA_VERSION))
+
+        self._db.execute(
+            'create table if not exists resources ('
+            'host text not null, '
+            'uri text not null, '
+            'etag text, '
+            'expires real, '
+            'body text not null, '
+            'primary key (host, uri))')
+
+    def get(self, uri):
+        '''Return (etag, expires, data) for uri, or None if uri is not cached'''
+
+        with self._lock:
+            row = self._db.execute(
+                'select etag, expires, body from resources '
+                'where host = ? and uri = ?',
+                (self.host, uri)).fetchone()
+
+        if row is not None:
+            return row[0], row[1], json_loads(row[2])
+
+    def set(self, uri, etag, expires, data):
+        with self._lock:
+            self._db.execute(
+                'replace into resources (host, uri, etag, expires, body) '
+                'values (?, ?, ?, ?, ?)',
+                (self.host, uri, etag, expires, json.dumps(data)))
+
+    def touch(self, uri, expires):
+        '''Update the expiry time of a cached entry'''
+
+        with self._lock:
+            self._db.execute(
+                'update resources set expires = ? '
+                'where host = ? and uri = ?',
+                (expires, self.host, uri))
+
+    def delete(self, uri):
+        with self._lock:
+            self._db.execute(
+                'delete from resources where host = ? and uri = ?',
+                (self.host, uri))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
 class IDRAC(requests.Session):
     def __init__(self, host, username, password,
                  verify=True,
-                 timeout=None):
+                 timeout=None,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 cache_path=None):
         super().__init__()
         self.baseurl = 'https://{}'.format(host)
 
         # set up the requests.Session attributes
         self.auth = (username, password)
         self.headers['Content-type'] = 'application/json'
+        self.headers['Connection'] = 'keep-alive'
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.headers['OData-Version'] = '4.0'
         self.verify = verify
         self.timeout = timeout
+        self.max_workers = max_workers
+
+        # Limits the number of requests in flight across all threads.
+        # _map calls may be nested (e.g. list_all_virtual_disks fans
+        # out over controllers, then over the disks of each one), so
+        # bounding each thread pool would not bound the total.
+        self._slots = threading.BoundedSemaphore(
+            max(1, min(max_workers, POOL_MAXSIZE)))
+
+        # Retry idempotent requests that fail with a transient server
+        # error. We let the final response through (raise_on_status=False)
+        # so that it is reported by raise_for_status in self.request.
+        # Read timeouts are not retried (read=False), otherwise a single
+        # request could take several times the read timeout. Nor do we
+        # let urllib3 sleep for as long as a Retry-After header asks:
+        # _poll honors Retry-After, within its own limits and deadline.
+        retries = Retry(
+            total=3,
+            read=False,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        self.mount('https://', HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=POOL_MAXSIZE,
+            max_retries=retries,
+        ))
 
         self._cache = {}
+        self._etags = {}
+        self._expires = {}
+        self._no_store = set()
+        self._retry_after = None
+        self._preference_applied = ''
+        self._session_uri = None
+        self._expand_supported = True
+        self._filter_supported = True
+        self._vd_index_by_name = None
+        self._vd_index_by_id = None
+        self._action_cache = {}
+
+        self._store = None
+        if cache_path is not None:
+            try:
+                self._store = ResourceCache(cache_path, host)
+            except (OSError, sqlite3.Error) as err:
+                LOG.warning('unable to open cache %s: %s', cache_path, err)
+
+    @classmethod
+    def from_module(cls, module):
+        '''Create an IDRAC using the parameters of an IDRACModule'''
+
+        cache_path = None
+        if module.params.get('cache', True):
+            cache_path = (module.params.get('cache_path') or
+                          default_cache_path(module.params['host']))
+
+        return cls(
+            module.params['host'],
+            module.params['auth']['username'],
+            module.params['auth']['password'],
+            verify=module.params['auth'].get('verify'),
+            timeout=module.params.get('timeout'),
+            cache_path=cache_path,
+        )
+
+    def login(self):
+        '''Authenticate using a Redfish session.
+
+        Exchange our credentials for a session token, which is then
+        sent with every request in place of basic authentication; the
+        iDRAC validates a token much faster than a password. If the
+        iDRAC won't create a session, we continue to use basic
+        authentication.
+
+        Call logout to delete the session when you are done.
+        '''
+
+        username, password = self.auth
+
+        try:
+            res = self._raw_request(
+                'POST', RESOURCES.sessions,
+                json={'UserName': username, 'Password': password})
+        except OperationFailed as err:
+            LOG.warning('unable to create session: %s', err)
+            return
+
+        token = res.headers.get('X-Auth-Token')
+        if not token:
+            LOG.warning('unable to create session: no token in response')
+            return
+
+        self._session_uri = urlparse(res.headers.get('Location', '')).path
+        self.headers['X-Auth-Token'] = token
+        self.auth = None
+
+    def logout(self):
+        '''Delete the session created by login, if any'''
+
+        if not self._session_uri:
+            return
+
+        try:
+            self._raw_request('DELETE', self._session_uri)
+        except OperationFailed as err:
+            LOG.warning('unable to delete session: %s', err)
+
+        self._session_uri = None
+
+    def _raw_request(self, method, uri, **kwargs):
+        '''Make a request and return the requests.Response.
+
+        Unlike self.request, this doesn't require or decode a JSON
+        response, for the few requests where we need the response
+        itself (e.g. for its headers).
+        '''
+
+        url = urljoin(self.baseurl, uri)
+        LOG.info('%s %s', method.lower(), url)
+        self._set_request_defaults(kwargs)
+
+        try:
+            with self._slots:
+                res = requests.Session.request(self, method, url, **kwargs)
+            res.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            raise OperationFailed(err)
+        except requests.exceptions.Timeout as err:
+            raise RequestTimeout(err)
+        except requests.exceptions.ConnectionError as err:
+            raise CommunicationFailure(err)
+
+        return res
+
+    def _set_request_defaults(self, kwargs):
+        '''Fill in per-request settings that requests won't take from us.
+
+        requests.Session has no timeout setting, and a verify setting on
+        the session is overridden by the REQUESTS_CA_BUNDLE environment
+        variable, so we pass both with every request.
+        '''
+
+        kwargs.setdefault('timeout', (
+            CONNECT_TIMEOUT,
+            self.timeout or DEFAULT_READ_TIMEOUT,
+        ))
+        kwargs.setdefault('verify', self.verify)
 
     def request(self, method, uri, **kwargs):
         '''Fetch a Redfish resource and return the unserialized response
@@ -131,23 +578,43 @@ class IDRAC(requests.Session):
         url = urljoin(self.baseurl, uri)
 
         LOG.info('fetch %s', url)
+        self._set_request_defaults(kwargs)
 
         try:
-            res = super().request(method, url, **kwargs)
+            with self._slots:
+                res = super().request(method, url, **kwargs)
+            self._retry_after = parse_retry_after(
+                res.headers.get('Retry-After'))
+            self._preference_applied = res.headers.get(
+                'Preference-Applied', '')
             res.raise_for_status()
         except requests.exceptions.HTTPError as err:
             raise OperationFailed(err)
+        except requests.exceptions.Timeout as err:
+            raise RequestTimeout(err)
         except requests.exceptions.ConnectionError as err:
             raise CommunicationFailure(err)
         else:
-            if res.headers['Content-type'].split(';')[0] != 'application/json':
-                raise ValueError('unexpected content type {}'.format(
-                    res.headers['Content-type']))
-
-            if not res.text:
+            if method.upper() == 'GET':
+                self._update_validators(uri, res)
+
+            # We only receive a 304 in response to a conditional request
+            # from _conditional_get, which means we already have the
+            # current representation of the resource.
+            if res.status_code == 304:
+                return self._cache[uri]
+
+            # Actions often succeed with an empty 204 response, which
+            # need not have a content type.
+            if res.status_code == 204 or not res.content:
                 data = {}
             else:
-                data = res.json()
+                content_type = res.headers.get('Content-Type', '')
+                if not content_type.startswith('application/json'):
+                    raise ValueError('unexpected content type {}'.format(
+                        content_type))
+
+                data = json_loads(res.content)
 
             # Because the job id for e.g. initilization jobs is
             # delivered via the Location header
@@ -157,6 +624,39 @@ class IDRAC(requests.Session):
 
             return data
 
+    def _update_validators(self, uri, res):
+        '''Record the caching information from a GET response.
+
+        This is the ETag, used for conditional requests, and the expiry
+        time implied by Cache-Control: max-age. Resources marked
+        no-store are never written to the on-disk cache.
+        '''
+
+        cache_control = parse_cache_control(res.headers.get('Cache-Control'))
+
+        if 'no-store' in cache_control:
+            self._etags.pop(uri, None)
+            self._expires.pop(uri, None)
+            self._no_store.add(uri)
+            return
+
+        self._no_store.discard(uri)
+
+        if 'ETag' in res.headers:
+            self._etags[uri] = res.headers['ETag']
+        elif res.status_code != 304:
+            self._etags.pop(uri, None)
+
+        try:
+            max_age = int(cache_control['max-age'])
+        except (KeyError, TypeError, ValueError):
+            max_age = None
+
+        if max_age and 'no-cache' not in cache_control:
+            self._expires[uri] = time.time() + max_age
+        else:
+            self._expires.pop(uri, None)
+
     def get(self, uri, **kwargs):
         '''Fetch a resource from the iDRAC using it's URI
 
@@ -175,29 +675,390 @@ class IDRAC(requests.Session):
 
         Use this when fetching resources that won't change during the
         course of a session.
+
+        Resources cached on disk by a previous session are used as-is
+        if they are still fresh according to the Cache-Control header
+        they were served with, and are otherwise revalidated with a
+        conditional request. If the iDRAC can't be reached to revalidate
+        a resource, the stale copy is returned.
+
+        Only resources fetched through this method are written to the
+        on-disk cache, since nothing else reads them back from it.
         '''
 
         LOG.debug('get %s, possibly from cache', uri)
-        return self._cache[uri] if uri in self._cache else self.get(uri)
+        if uri in self._cache:
+            return self._cache[uri]
+
+        stored = self._call_store('get', uri)
+        if stored is None:
+            return self._store_resource(uri, self.get(uri))
+
+        etag, expires, data = stored
+        if expires is not None and time.time() < expires:
+            LOG.debug('using fresh cached copy of %s', uri)
+            self._cache[uri] = data
+            return data
+
+        if etag is None:
+            return self._store_resource(uri, self.get(uri))
+
+        self._etags[uri], self._cache[uri] = etag, data
+        try:
+            res = self._conditional_get(uri)
+        except CommunicationFailure as err:
+            LOG.warning('using stale cached copy of %s: %s', uri, err)
+            return data
+        except IDRACError:
+            self._cache.pop(uri, None)
+            raise
+
+        if res is data:
+            # The iDRAC answered 304 Not Modified, so the stored body
+            # is current; at most its expiry time has changed.
+            if uri in self._no_store:
+                self._call_store('delete', uri)
+            elif self._expires.get(uri) != expires:
+                self._call_store('touch', uri, self._expires.get(uri))
+            return res
+
+        return self._store_resource(uri, res)
+
+    def _store_resource(self, uri, data):
+        '''Write data to the on-disk cache if it can be revalidated.
+
+        Returns data.
+        '''
+
+        if uri in self._no_store:
+            self._call_store('delete', uri)
+        elif uri in self._etags or uri in self._expires:
+            self._call_store('set', uri,
+                             self._etags.get(uri),
+                             self._expires.get(uri),
+                             data)
+
+        return data
+
+    def invalidate(self, uri):
+        '''Discard any cached copy of the given resource'''
+
+        LOG.debug('invalidate %s', uri)
+        self._cache.pop(uri, None)
+        self._etags.pop(uri, None)
+        self._expires.pop(uri, None)
+        self._call_store('delete', uri)
+
+    def close(self):
+        super().close()
+        self._call_store('close')
+
+    def _call_store(self, method, *args):
+        '''Call a method of the persistent cache, if there is one.
+
+        The cache is only an optimization, so if it fails (for example
+        because another process holds the database lock) we log the
+        error and continue without it, rather than failing the request.
+        Returns None if there is no cache or the call failed.
+        '''
+
+        store = self._store
+        if store is None:
+            return None
+
+        try:
+            return getattr(store, method)(*args)
+        except (sqlite3.Error, ValueError) as err:
+            LOG.warning('disabling resource cache: %s', err)
+            self._store = None
+            try:
+                store.close()
+            except sqlite3.Error:
+                pass
+
+    def _conditional_get(self, uri, **kwargs):
+        '''Like self.get, but avoid transferring unchanged resources.
+
+        If we have previously seen an ETag for this uri, send it in an
+        If-None-Match header; the iDRAC will respond with a 304 (and an
+        empty body) if the resource has not changed, in which case we
+        return the cached value.
+        '''
+
+        if uri in self._etags and uri in self._cache:
+            headers = kwargs.setdefault('headers', {})
+            headers['If-None-Match'] = self._etags[uri]
+
+        return self.get(uri, **kwargs)
+
+    def _poll(self, timeout=None):
+        '''Yield repeatedly with exponential backoff between iterations.
+
+        Each iteration yields the number of seconds remaining before
+        the timeout (or None if there is no timeout). The caller is
+        expected to break out of the loop when whatever it is waiting
+        for has happened. If timeout is not None, raise a TimeoutError
+        once timeout seconds have elapsed.
+
+        If the most recent response included a Retry-After header, wait
+        for the requested interval (up to POLL_MAX_DELAY) instead of the
+        computed delay. If the iDRAC held the most recent request open
+        (Preference-Applied: wait), poll again immediately. We never
+        sleep past the deadline.
+        '''
+
+        deadline = time.monotonic() + timeout if timeout else None
+        delay = POLL_MIN_DELAY
+
+        while True:
+            yield deadline - time.monotonic() if deadline else None
+
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError()
+
+            if self._retry_after is not None:
+                pause = min(self._retry_after, POLL_MAX_DELAY)
+            elif 'wait' not in self._preference_applied:
+                pause = delay + random.uniform(0, delay * POLL_JITTER)
+            else:
+                pause = 0
+
+            if deadline:
+                pause = min(pause, max(0, deadline - time.monotonic()))
+
+            if pause:
+                time.sleep(pause)
+
+            delay = min(delay * 2, POLL_MAX_DELAY)
 
     def _extract_members(self, data,
                          member_attr='Members',
                          detail=False,
                          cache=False):
-        '''Return the list of members from a Redfish container resource'''
-        members = []
-        for member in data[member_attr]:
-            uri = member['@odata.id']
-
-            if detail:
-                if cache:
-                    members.append(self.get_cached(uri))
-                else:
-                    members.append(self.get(uri))
-            else:
-                members.append(uri)
+        '''Return the list of members from a Redfish container resource
+
+        If the container was fetched with _get_collection(expand=True),
+        members will already be complete resources and we only need
+        to fetch those the iDRAC did not expand.
+        '''
+        members = list(self._iter_members(data, member_attr=member_attr))
+
+        if not detail:
+            return [member['@odata.id'] for member in members]
+
+        expanded = {member['@odata.id']: member
+                    for member in members if len(member) > 1}
+        self._cache.update(expanded)
 
-        return members
+        missing = [member['@odata.id'] for member in members
+                   if member['@odata.id'] not in expanded]
+        fetched = dict(zip(missing, self._map(
+            self.get_cached if cache else self.get, missing)))
+
+        return [expanded.get(member['@odata.id']) or
+                fetched[member['@odata.id']]
+                for member in members]
+
+    def _iter_members(self, data, member_attr='Members'):
+        '''Iterate over the members of a Redfish container resource.
+
+        Large collections may be split into pages, in which case each
+        page links to the next via <member_attr>@odata.nextLink. We
+        follow those links so that callers see every member.
+        '''
+
+        while True:
+            yield from data[member_attr]
+
+            next_link = data.get('{}@odata.nextLink'.format(member_attr))
+            if not next_link:
+                break
+
+            data = self.get(next_link)
+
+    def _get_collection(self, uri, expand=False, cache=False,
+                        filter_expr=None):
+        '''Fetch a Redfish collection.
+
+        If expand is True, ask the iDRAC to inline the collection
+        members so that they don't need to be fetched individually. If
+        the iDRAC doesn't support $expand, fall back to fetching the
+        plain collection (and don't try to expand again).
+
+        If filter_expr is not None, ask the iDRAC to return only the
+        members matching the given $filter expression. The iDRAC may not
+        support this, so callers must still filter the members
+        themselves.
+        '''
+
+        fetch = self.get_cached if cache else self.get
+
+        if filter_expr is not None:
+            data = self._get_filtered_collection(
+                uri, filter_expr, expand=expand, cache=cache)
+            if data is not None:
+                return data
+
+        if expand and self._expand_supported:
+            try:
+                return fetch('{}?{}'.format(uri, EXPAND_QUERY))
+            except OperationFailed as err:
+                if not self._is_unsupported_query(err):
+                    raise
+
+                LOG.info('$expand is not supported: %s', err)
+                self._expand_supported = False
+
+        return fetch(uri)
+
+    def _get_filtered_collection(self, uri, filter_expr,
+                                 expand=False, cache=False):
+        '''Fetch the members of a collection matching filter_expr.
+
+        Returns None if the iDRAC doesn't support $filter.
+        '''
+
+        if not self._filter_supported:
+            return None
+
+        fetch = self.get_cached if cache else self.get
+        query = ['$filter={}'.format(quote(filter_expr))]
+        if expand and self._expand_supported:
+            query.append(EXPAND_QUERY)
+
+        try:
+            return fetch('{}?{}'.format(uri, '&'.join(query)))
+        except OperationFailed as err:
+            if not self._is_unsupported_query(err):
+                raise
+
+            LOG.info('$filter is not supported: %s', err)
+            self._filter_supported = False
+
+    def _stream_members(self, uri, member_attr='Members'):
+        '''Iterate over the members of a collection as it is parsed.
+
+        Like _iter_members, but rather than decoding each page of the
+        collection at once, members are decoded (using ijson) and
+        yielded one at a time, so callers that discard most of the
+        members never hold the complete collection in memory. Members
+        that the iDRAC did not expand are fetched individually.
+
+        Errors while reading the response are raised as RequestTimeout
+        or CommunicationFailure, as they would be by _raw_request.
+        '''
+
+        item_prefix = '{}.item'.format(member_attr)
+        next_link_prefix = '{}@odata.nextLink'.format(member_attr)
+
+        while uri:
+            res = self._raw_request('GET', uri, stream=True)
+            res.raw.decode_content = True
+
+            uri = None
+            builder = None
+            with res:
+                try:
+                    for prefix, event, value in ijson.parse(
+                            res.raw, use_float=True):
+                        if builder is not None:
+                            builder.event(event, value)
+                            if prefix == item_prefix and event == 'end_map':
+                                member = builder.value
+                                builder = None
+                                if len(member) > 1:
+                                    yield member
+                                else:
+                                    yield self.get(member['@odata.id'])
+                        elif prefix == item_prefix and event == 'start_map':
+                            builder = ijson.ObjectBuilder()
+                            builder.event(event, value)
+                        elif prefix == next_link_prefix and event == 'string':
+                            uri = value
+                except urllib3.exceptions.TimeoutError as err:
+                    raise RequestTimeout(requests.exceptions.ReadTimeout(
+                        err, request=res.request))
+                except (urllib3.exceptions.HTTPError, ijson.JSONError) as err:
+                    # Typically the connection was lost part way through
+                    # the response, leaving the JSON incomplete.
+                    raise CommunicationFailure(
+                        requests.exceptions.ConnectionError(
+                            err, request=res.request))
+
+    def _is_unsupported_query(self, err):
+        '''True if err means the iDRAC doesn't support a query parameter'''
+        return err.response is not None and \
+            err.response.status_code in (400, 501)
+
+    def _map(self, func, items):
+        '''Return [func(item) for item in items], running calls concurrently.
+
+        This is used to fetch many resources in parallel; the requests
+        share the session's connection pool. Exceptions raised by func
+        are propagated to the caller.
+
+        However calls to _map are nested, no more than max_workers (or
+        POOL_MAXSIZE, if smaller) requests are in flight at once; see
+        self._slots. Connections created beyond the size of the pool
+        are discarded after use, so each one would cost a new TLS
+        handshake.
+        '''
+
+        items = list(items)
+        workers = min(self.max_workers, POOL_MAXSIZE, len(items))
+        if workers < 2:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, items))
+
+    def _imap(self, func, items):
+        '''Like _map, but yield results one at a time, in order.
+
+        Calls run concurrently as with _map. If the caller stops
+        iterating early, calls that have not yet started are cancelled.
+        '''
+
+        items = list(items)
+        workers = min(self.max_workers, POOL_MAXSIZE, len(items))
+        if workers < 2:
+            yield from map(func, items)
+            return
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = [pool.submit(func, item) for item in items]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def _get_action(self, uri, action):
+        '''Return the target and allowable parameter values of an action.
+
+        The allowable values are returned as a dictionary mapping each
+        parameter name to a frozenset of values. Action descriptors
+        don't change, so the result is cached for the life of the session.
+        '''
+
+        key = (uri, action)
+        if key not in self._action_cache:
+            obj = self.get_cached(uri)
+
+            # raises KeyError if the named action doesn't exist
+            descriptor = obj['Actions'][action]
+
+            allowable = {
+                name[:-len(ALLOWABLE_VALUES_SUFFIX)]: frozenset(values)
+                for name, values in descriptor.items()
+                if name.endswith(ALLOWABLE_VALUES_SUFFIX)
+            }
+
+            self._action_cache[key] = (descriptor['target'], allowable)
+
+        return self._action_cache[key]
 
     def _execute_action(self, uri, action, **params):
         '''Execute a named action on a Redfish resource.
@@ -207,42 +1068,78 @@ class IDRAC(requests.Session):
         '''
 
         LOG.debug('trying to execute action %s on %s', action, uri)
-        obj = self.get_cached(uri)
-
-        # raises KeyError if the named action doesn't exist
-        action = obj['Actions'][action]
+        target, allowable = self._get_action(uri, action)
 
         for pname, pval in params.items():
             # raises KeyError if the named parameter doesn't exist
-            allowable_values = action['{}@Redfish.AllowableValues'.format(pname)]
-
-            if pval not in allowable_values:
+            if pval not in allowable[pname]:
                 raise ValueError(pval)
 
-        return self.post(action['target'],
-                         json=params)
+        try:
+            body = _encode_action_body(tuple(sorted(params.items())))
+        except TypeError:
+            # parameter values are not hashable
+            body = json_dumps(params)
+
+        res = self.post(target,
+                        data=body)
+
+        # The action has presumably modified the resource
+        self.invalidate(uri)
+
+        return res
 
     def list_storage_controllers(self, detail=False):
-        data = self.get_cached(RESOURCES.storage)
+        data = self._get_collection(
+            RESOURCES.storage, expand=detail, cache=True)
         return self._extract_members(data, detail=detail, cache=True)
 
     def list_virtual_disks(self, uri, detail=False):
         '''Return a list of virtual disks on the given controller'''
 
-        data = self.get_cached('{}/Volumes'.format(uri))
+        data = self._get_collection(
+            '{}/Volumes'.format(uri), expand=detail, cache=True)
         return self._extract_members(data, detail=detail, cache=True)
 
     def list_all_virtual_disks(self, detail=False):
         '''Return a list of virtual disks on all controllers'''
 
         disks = []
-        for controller in self.list_storage_controllers():
-            for member in self.list_virtual_disks(
-                    controller, detail=detail):
-                disks.append(member)
+        for members in self._map(
+                lambda controller: self.list_virtual_disks(
+                    controller, detail=detail),
+                self.list_storage_controllers()):
+            disks.extend(members)
 
         return disks
 
+    def iter_all_virtual_disks(self):
+        '''Yield the details of the virtual disks on all controllers.
+
+        Disks are yielded in the same order as list_all_virtual_disks,
+        but controllers are listed one at a time, so a caller that stops
+        iterating early (e.g. because it has found the disk it was
+        looking for) doesn't wait for the remaining controllers. If the
+        iDRAC doesn't expand a controller's disks, they are fetched
+        concurrently and requests that have not started when the caller
+        stops are cancelled.
+        '''
+
+        def fetch(member):
+            if len(member) > 1:
+                return member
+
+            return self.get_cached(member['@odata.id'])
+
+        for controller in self.list_storage_controllers():
+            data = self._get_collection(
+                '{}/Volumes'.format(controller), expand=True, cache=True)
+            members = list(self._iter_members(data))
+            self._cache.update((member['@odata.id'], member)
+                               for member in members if len(member) > 1)
+
+            yield from self._imap(fetch, members)
+
     def get_virtual_disk(self, did):
         '''Get a disk by ID or URI.
 
@@ -256,21 +1153,40 @@ class IDRAC(requests.Session):
 
         return self.get(did)
 
+    def _index_virtual_disks(self):
+        '''Build the name -> uri and id -> uri virtual disk indexes.
+
+        The indexes are built on first use and discarded by
+        initialize_virtual_disk, which may change the set of disks.
+        Names (and in principle ids) may repeat across controllers; as
+        with a linear search, the first matching disk wins.
+        '''
+
+        if self._vd_index_by_name is None or self._vd_index_by_id is None:
+            by_name = {}
+            by_id = {}
+            for disk in self.list_all_virtual_disks(detail=True):
+                by_name.setdefault(disk['Name'], disk['@odata.id'])
+                by_id.setdefault(disk['Id'], disk['@odata.id'])
+
+            self._vd_index_by_name = by_name
+            self._vd_index_by_id = by_id
+
     def get_virtual_disk_by_name(self, want_name):
         '''Find a virtual disk for which the Name key matches want_name'''
 
-        for disk in self.list_all_virtual_disks():
-            detail = self.get(disk)
-            if detail['Name'] == want_name:
-                return detail
+        self._index_virtual_disks()
+        uri = self._vd_index_by_name.get(want_name)
+        if uri is not None:
+            return self.get_cached(uri)
 
     def get_virtual_disk_by_id(self, want_id):
         '''Find a virtual disk for which the Id key matches want_id'''
 
-        for disk in self.list_all_virtual_disks():
-            detail = self.get(disk)
-            if detail['Id'] == want_id:
-                return detail
+        self._index_virtual_disks()
+        uri = self._vd_index_by_id.get(want_id)
+        if uri is not None:
+            return self.get_cached(uri)
 
     def initialize_virtual_disk(self, uri, fast=True):
         '''Initialize a virtual disk.
@@ -280,6 +1196,7 @@ class IDRAC(requests.Session):
 
         LOG.debug('initialize disk %s (fast=%s)', uri, fast)
         init_type = 'Fast' if fast else 'Slow'
+        self._vd_index_by_name = self._vd_index_by_id = None
         disk = self.get(uri)
         if disk['Operations']:
             raise OperationInProgress()
@@ -290,73 +1207,308 @@ class IDRAC(requests.Session):
             InitializeType=init_type,
         )
 
+        # We have just created a new job
+        self.invalidate(RESOURCES.jobs)
+
         if 'JID' not in res['_location']:
             raise JobSchedulingFailed('failed to allocate job id')
 
-        jid = res['_location'].split('/')[-1]
+        jid = res['_location'].rpartition('/')[2]
         return jid
 
-    def list_jobs(self, detail=False):
-        data = self.get_cached(RESOURCES.jobs)
-        members = self._extract_members(data)
+    def list_jobs(self, detail=False, states=None):
+        '''Return a list of jobs.
 
-        if detail:
-            return [self.get_job(member) for member in members]
-        else:
-            return members
+        If states is not None, return only jobs in one of the given
+        JOB_STATE states. This requires detail=True. Where possible, the
+        iDRAC filters the jobs itself.
+        '''
+
+        if states is not None:
+            if not detail:
+                raise ValueError('filtering by state requires detail=True')
 
-    def get_job(self, jid):
+            states = frozenset(states)
+
+        get_state = self.get_job_state
+
+        if not detail:
+            return self._extract_members(self.get_cached(RESOURCES.jobs))
+
+        # Job details change, so we always fetch them fresh.
+        data = None
+        filter_expr = job_state_filter(states)
+        if filter_expr is not None:
+            data = self._get_filtered_collection(
+                RESOURCES.jobs, filter_expr, expand=True)
+
+        # If the iDRAC can't filter the jobs for us, filter them as they
+        # are parsed rather than decoding every job first.
+        if data is None and states is not None and \
+                ijson is not None and self._expand_supported:
+            try:
+                return [job for job in self._stream_members(
+                    '{}?{}'.format(RESOURCES.jobs, EXPAND_QUERY))
+                    if get_state(job) in states]
+            except OperationFailed as err:
+                if not self._is_unsupported_query(err):
+                    raise
+
+                LOG.info('$expand is not supported: %s', err)
+                self._expand_supported = False
+
+        if data is None:
+            data = self._get_collection(RESOURCES.jobs, expand=True)
+
+        jobs = self._extract_members(data, detail=True)
+
+        if states is not None:
+            jobs = [job for job in jobs if get_state(job) in states]
+
+        return jobs
+
+    def get_job(self, jid, conditional=False, **kwargs):
         '''Get a job by ID or URI.
 
         The 'jid' parameter may either by a raw job id (JID_123456) or
         the uri of a job (/redfish/v1/.../Jobs/JID_123456).
+
+        If conditional is True, avoid re-transferring the job if it has
+        not changed since we last fetched it.
         '''
 
         if not jid.startswith('/'):
             jid = '{}/{}'.format(RESOURCES.jobs, jid)
 
-        return self.get(jid)
+        if conditional:
+            return self._conditional_get(jid, **kwargs)
+
+        return self.get(jid, **kwargs)
 
     def get_job_state(self, job):
-        if 'failed' in job['Message'].lower():
+        msg = job['Message']
+        state = _STATE_TABLE.get(msg)
+        if state is not None:
+            return state
+        elif 'failed' in msg.lower():
             return JOB_STATE.failed
-        elif job['Message'] == 'Task successfully scheduled.':
-            return JOB_STATE.scheduled
-        elif job['Message'] == 'Job in progress.':
-            return JOB_STATE.running
-        elif job['Message'] == 'Job completed successfully.':
-            return JOB_STATE.finished
         else:
-            return JOB_STATE.unknown
+            return _JOBSTATE_TABLE.get(job.get('JobState'), JOB_STATE.unknown)
+
+    def get_system(self, cached=False):
+        '''Get the system resource.
+
+        If cached is True, a copy of the system cached by an earlier
+        session may be returned (see get_cached). Only use this when
+        reporting the system; decisions about its power state should
+        be based on a fresh copy.
+        '''
+
+        if cached:
+            return self.get_cached(RESOURCES.system)
 
-    def get_system(self):
         return self.get(RESOURCES.system)
 
     def wait_for_job_state(self, jid, want_state, timeout=None):
         '''Wait until a job reaches want_state.
 
         This calls get_job, so jid may be either a raw job id or
-        a job uri.
+        a job uri. Returns the job as it was when it reached
+        want_state.
 
         If timeout is not None, raise a TimeoutError if the job
         does not reach the specified state in timeout seconds.
         '''
 
         LOG.info('waiting for job state %s', want_state)
-        time_start = time.time()
 
-        while True:
-            job = self.get_job(jid)
-            have_state = self.get_job_state(job)
-            LOG.debug('want %s, have %s', want_state, have_state)
+        for remaining in self._poll(timeout=timeout):
+            wait = LONG_POLL_WAIT
+            if remaining is not None:
+                wait = max(1, min(wait, int(remaining)))
+
+            try:
+                job = self.get_job(jid, conditional=True, headers={
+                    'Prefer': 'return=representation, wait={}'.format(wait),
+                })
+            except RequestTimeout as err:
+                LOG.debug('request timed out while waiting: %s', err)
+                continue
+
+            if self._job_reached_state(job, want_state):
+                return job
+
+    def _job_reached_state(self, job, want_state):
+        '''Return True if job is in want_state.
+
+        Raises UnexpectedJobState if the job has finished in some other
+        state, since it will never reach want_state.
+        '''
+
+        have_state = self.get_job_state(job)
+        LOG.debug('want %s, have %s', want_state, have_state)
+
+        if have_state == want_state:
+            return True
+
+        if have_state in TERMINAL_JOB_STATES:
+            raise UnexpectedJobState(job, have_state)
+
+        return False
+
+    def wait_for_jobs(self, jids, want_state, timeout=None):
+        '''Wait until every job in jids reaches want_state.
+
+        Like wait_for_job_state, but rather than waiting for each job
+        in turn we check all of the outstanding jobs on every poll. If
+        the iDRAC supports $expand, this is a single request per poll.
+
+        If timeout is not None, raise a TimeoutError if all of the jobs
+        do not reach the specified state in timeout seconds.
+        '''
+
+        pending = {jid.rpartition('/')[2] for jid in jids}
+        LOG.info('waiting for %d jobs to reach state %s',
+                 len(pending), want_state)
+
+        if not pending:
+            return
 
-            if have_state == want_state:
+        for _ in self._poll(timeout=timeout):
+            try:
+                jobs = self._get_pending_jobs(pending)
+            except RequestTimeout as err:
+                LOG.debug('request timed out while waiting: %s', err)
+                continue
+
+            pending -= {job['Id'] for job in jobs
+                        if job['Id'] in pending and
+                        self._job_reached_state(job, want_state)}
+            LOG.debug('%d jobs not yet in state %s', len(pending), want_state)
+
+            if not pending:
                 break
 
-            if timeout and (time.time() - time_start) > timeout:
+    def _get_pending_jobs(self, pending):
+        '''Fetch the jobs with the ids in pending (and possibly others).
+
+        If the iDRAC expands the jobs collection, this is a single
+        request. Jobs it doesn't expand are fetched individually, but
+        only if they are pending; if it expands none of them (some
+        firmware ignores $expand) we stop asking it to.
+        '''
+
+        if not self._expand_supported:
+            return self._map(self.get_job, pending)
+
+        data = self._get_collection(RESOURCES.jobs, expand=True)
+        members = list(self._iter_members(data))
+        jobs = [member for member in members if len(member) > 1]
+
+        if members and not jobs:
+            LOG.info('$expand was ignored for %s', RESOURCES.jobs)
+            self._expand_supported = False
+
+        missing = pending - {job['Id'] for job in jobs}
+        jobs.extend(self._map(self.get_job, missing))
+        return jobs
+
+    def wait_for_job_state_sse(self, jid, want_state, timeout=None):
+        '''Wait until a job reaches want_state using server-sent events.
+
+        Rather than polling the job, subscribe to the iDRAC's event
+        stream and only re-fetch the job when an event mentions it. If
+        no event arrives within POLL_MAX_DELAY seconds we check the job
+        anyway, and reconnect.
+
+        Falls back to wait_for_job_state if the iDRAC does not support
+        server-sent events. Like wait_for_job_state, returns the job.
+        '''
+
+        LOG.info('waiting for job state %s (sse)', want_state)
+        deadline = time.monotonic() + timeout if timeout else None
+        job_id = jid.rpartition('/')[2]
+
+        def time_left():
+            '''Seconds until the deadline, or None if there is none'''
+
+            if deadline is None:
+                return None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 raise TimeoutError()
 
-            time.sleep(5)
+            return remaining
+
+        try:
+            sse_uri = self.get_cached(RESOURCES.events)['ServerSentEventUri']
+        except (OperationFailed, KeyError) as err:
+            LOG.info('server-sent events are not available: %s', err)
+            return self.wait_for_job_state(jid, want_state, timeout=timeout)
+
+        # Back off between reconnects, so that an iDRAC which closes
+        # the stream straight away is not hammered with requests. The
+        # backoff starts again after a stream that stayed open.
+        polls = self._poll(timeout=timeout)
+        while True:
+            next(polls)
+            remaining = time_left()
+
+            try:
+                stream = self._open_event_stream(
+                    sse_uri, timeout=min(POLL_MAX_DELAY,
+                                         remaining or POLL_MAX_DELAY))
+            except OperationFailed as err:
+                # Besides 404 or 501, the iDRAC may refuse the stream
+                # (e.g. 400 or 403 without the required license), or
+                # the request may fail outright; polling still works.
+                LOG.info('server-sent events are not available: %s', err)
+                return self.wait_for_job_state(
+                    jid, want_state, timeout=time_left())
+
+            opened = time.monotonic()
+            with stream:
+                try:
+                    # Check the job after opening the stream, so that we
+                    # can't miss an event that arrives in between.
+                    for line in itertools.chain([None], stream.iter_lines(
+                            decode_unicode=True)):
+                        time_left()
+
+                        if line is not None and not (
+                                line.startswith('data:') and job_id in line):
+                            continue
+
+                        try:
+                            job = self.get_job(jid)
+                        except RequestTimeout as err:
+                            LOG.debug('request timed out while waiting: %s',
+                                      err)
+                            continue
+
+                        if self._job_reached_state(job, want_state):
+                            return job
+                except requests.exceptions.RequestException as err:
+                    # This is typically a read timeout because there
+                    # were no events.
+                    LOG.debug('event stream interrupted: %s', err)
+
+            if time.monotonic() - opened >= POLL_MAX_DELAY:
+                polls = self._poll(timeout=time_left())
+
+    def _open_event_stream(self, uri, timeout=POLL_MAX_DELAY):
+        '''Open the server-sent event stream at uri.
+
+        Returns a streaming requests.Response. If no data arrives for
+        timeout seconds, reading from the stream raises an exception.
+        '''
+
+        return self._raw_request(
+            'GET', uri,
+            headers={'Accept': 'text/event-stream'},
+            stream=True,
+            timeout=(CONNECT_TIMEOUT, timeout))
 
     def wait_for_power_state(self, want_state, timeout=None):
         '''Wait for the system to achieve the named power state.
@@ -366,21 +1518,20 @@ class IDRAC(requests.Session):
         '''
 
         LOG.info('waiting for power state %s', want_state)
-        time_start = time.time()
 
-        while True:
-            system = self.get_system()
+        for _ in self._poll(timeout=timeout):
+            try:
+                system = self._conditional_get(RESOURCES.system)
+            except RequestTimeout as err:
+                LOG.debug('request timed out while waiting: %s', err)
+                continue
+
             have_state = system['PowerState']
             LOG.debug('want %s, have %s', want_state, have_state)
 
             if want_state == have_state:
                 break
 
-            if timeout and (time.time() - time_start) > timeout:
-                raise TimeoutError()
-
-            time.sleep(5)
-
     def get_manager(self):
         return self.get(RESOURCES.manager)
 
@@ -396,9 +1547,7 @@ class IDRAC(requests.Session):
     def wait_for_manager(self, timeout=None):
         '''Wait for the iDRAC to become available'''
 
-        time_start = time.time()
-
-        while True:
+        for _ in self._poll(timeout=timeout):
             try:
                 self.get('/redfish')
             except OperationFailed as err:
@@ -406,11 +1555,6 @@ class IDRAC(requests.Session):
             else:
                 break
 
-            if timeout and time.time() - time_start() > timeout:
-                raise TimeoutError()
-
-            time.sleep(5)
-
     def reset_system(self, reset_type):
         '''Reset the system.
 
@@ -1,3 +1,8 @@
+import atexit
+import socket
+
+from urllib.parse import urlparse
+
 from ansible.module_utils.basic import AnsibleModule
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 
@@ -5,26 +10,42 @@ AUTH_REQUIRED_KEYS = (
     'username', 'password'
 )
 
+# How long (in seconds) to wait for a TCP connection to the iDRAC
+# before deciding that it is unreachable.
+PROBE_TIMEOUT = 2
+
+# Options accepted by every IDRACModule, in addition to the module's
+# own argument_spec.
+COMMON_ARGS = {
+    'host': {
+        'type': 'str',
+        'required': True,
+    },
+    'timeout': {
+        'type': 'int',
+        'required': False,
+    },
+    'cache': {
+        'type': 'bool',
+        'default': True,
+    },
+    'cache_path': {
+        'type': 'path',
+        'required': False,
+    },
+    'auth': {
+        'type': 'dict',
+        'required': True,
+        'aliases': ['connection'],
+    },
+}
+
 
 class IDRACModule(AnsibleModule):
     def __init__(self, argument_spec=None, **kwargs):
-        if argument_spec is None:
-            argument_spec = {}
-
-        argument_spec.update({
-            'host': {
-                'type': 'str',
-                'required': True,
-            },
-            'timeout': {
-                'type': 'int',
-                'required': False,
-            },
-            'auth': {
-                'type': 'dict',
-                'required': True,
-            }
-        })
+        # Don't modify the caller's argument_spec, which is usually
+        # a module level constant.
+        argument_spec = dict(argument_spec or {}, **COMMON_ARGS)
 
         super().__init__(argument_spec=argument_spec, **kwargs)
 
@@ -33,10 +54,85 @@ class IDRACModule(AnsibleModule):
                 self.fail_json(
                     msg='missing required auth option {}'.format(k))
 
-        self.api = idrac.IDRAC(
-            self.params['host'],
-            self.params['auth']['username'],
-            self.params['auth']['password'],
-            verify=self.params['auth'].get('verify'),
-            timeout=self.params.get('timeout'),
-        )
+        self._api = None
+
+    @property
+    def api(self):
+        '''The IDRAC client for this module.
+
+        We don't contact the iDRAC until the module first uses the
+        client, so a module that exits early (for example in check
+        mode) makes no requests at all. A single session is used for
+        every request made by the module; we delete it when the module
+        exits (exit_json and fail_json both end in sys.exit).
+        '''
+
+        if self._api is None:
+            self.probe()
+            self._api = idrac.IDRAC.from_module(self)
+            self._api.login()
+            atexit.register(self._api.logout)
+
+        return self._api
+
+    def probe(self):
+        '''Fail unless we can open a TCP connection to the iDRAC.
+
+        An iDRAC that is powered off or on the wrong network would
+        otherwise only be noticed after the (much longer) timeout of
+        the first HTTPS request.
+        '''
+
+        url = urlparse('https://{}'.format(self.params['host']))
+        host, port = url.hostname, url.port or 443
+
+        try:
+            conn = socket.create_connection(
+                (host, port), timeout=PROBE_TIMEOUT)
+            conn.close()
+        except OSError as err:
+            self.fail_json(
+                msg='iDRAC unreachable at {}:{}: {}'.format(host, port, err))
+
+
+def run_simple(argument_spec, fn, result_key=None, changed=False):
+    '''Run a module that makes a single api call.
+
+    fn is called as fn(api, params). If result_key is not None, the
+    return value of fn is reported as idrac[result_key]. Modules that
+    modify the iDRAC should pass changed=True.
+
+    In check mode fn is not called; we report what the module would
+    have changed and exit.
+    '''
+
+    module = IDRACModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True,
+    )
+
+    result = dict(
+        changed=changed,
+    )
+
+    if module.check_mode:
+        if result_key is not None:
+            result['idrac'] = {}
+        module.exit_json(**result)
+
+    try:
+        value = fn(module.api, module.params)
+    except (TimeoutError, idrac.RequestTimeout) as err:
+        msg = 'timeout waiting for the iDRAC'
+        if str(err):
+            msg = '{}: {}'.format(msg, err)
+        module.fail_json(msg=msg)
+    except idrac.OperationFailed as err:
+        module.fail_json(msg=str(err), errors=err.errors)
+
+    if result_key is not None:
+        result['idrac'] = {
+            result_key: value,
+        }
+
+    module.exit_json(**result)
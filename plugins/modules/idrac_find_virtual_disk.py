@@ -1,14 +1,14 @@
-import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        disk=dict(type='list', required=True),
-    )
+MODULE_ARGS = dict(
+    disk=dict(type='list', required=True),
+)
+
 
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
+        argument_spec=MODULE_ARGS,
         supports_check_mode=True
     )
 
@@ -16,13 +16,16 @@ def main():
         changed=False,
     )
 
-    for disk in module.api.list_all_virtual_disks():
-        detail = module.api.get(disk)
-        if any(
-            'id' in spec and detail['Id'] == spec.get('id') or
-            'name' in spec and detail['Name'] == spec.get('name')
-            for spec in module.params['disk']
-        ):
+    specs = module.params['disk']
+    wanted_ids = {spec['id'] for spec in specs if 'id' in spec}
+    wanted_names = {spec['name'] for spec in specs if 'name' in spec}
+
+    if module.check_mode:
+        result['idrac'] = {}
+        module.exit_json(**result)
+
+    for detail in module.api.iter_all_virtual_disks():
+        if detail['Id'] in wanted_ids or detail['Name'] in wanted_names:
             break
     else:
         module.fail_json(msg='Failed to find any matching disks')
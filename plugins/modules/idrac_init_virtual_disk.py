@@ -2,15 +2,16 @@ import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        disk=dict(type='dict'),
-        disk_id=dict(type='str'),
-        fast=dict(type='bool', default=True),
-    )
+MODULE_ARGS = dict(
+    disk=dict(type='dict'),
+    disk_id=dict(type='str'),
+    fast=dict(type='bool', default=True),
+)
 
+
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
+        argument_spec=MODULE_ARGS,
         supports_check_mode=False,
     )
 
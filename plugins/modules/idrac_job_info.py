@@ -1,15 +1,15 @@
-import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        job=dict(type='dict'),
-        job_id=dict(type='str'),
-    )
+MODULE_ARGS = dict(
+    job=dict(type='dict'),
+    job_id=dict(type='str'),
+)
+
 
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
+        argument_spec=MODULE_ARGS,
         supports_check_mode=True,
     )
 
@@ -25,10 +25,19 @@ def main():
         module.fail_json(
             msg='you must provide one of job or job_id')
 
+    if module.check_mode:
+        result['idrac'] = {
+            'job': {
+                'id': jid,
+            }
+        }
+        module.exit_json(**result)
+
     job = module.api.get_job(jid)
 
     result['idrac'] = {
         'job': job,
+        'state': module.api.get_job_state(job).name,
     }
     module.exit_json(**result)
 
@@ -2,14 +2,16 @@ import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        states=dict(type='list'),
-        detail=dict(type='bool', default=False),
-    )
+MODULE_ARGS = dict(
+    states=dict(type='list', elements='str',
+                choices=list(idrac.JOB_STATE.__members__)),
+    detail=dict(type='bool', default=False),
+)
 
+
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
+        argument_spec=MODULE_ARGS,
         supports_check_mode=True,
     )
 
@@ -21,17 +23,24 @@ def main():
         module.fail_json(
             msg='filtering by state requires detail=true')
 
-    jobs = module.api.list_jobs(detail=module.params['detail'])
-
     if module.params['states']:
-        states = [getattr(idrac.JOB_STATE, state) for state in module.params['states']]
+        states = frozenset(idrac.JOB_STATE[state]
+                           for state in module.params['states'])
     else:
         states = None
 
+    if module.check_mode:
+        result['idrac'] = {}
+        module.exit_json(**result)
+
+    try:
+        jobs = module.api.list_jobs(detail=module.params['detail'],
+                                    states=states)
+    except idrac.OperationFailed as err:
+        module.fail_json(msg=str(err), errors=err.errors)
+
     result['idrac'] = {
-        'jobs': [job for job in jobs
-                 if states is None or
-                 module.api.get_job_state(job) in states]
+        'jobs': jobs,
     }
 
     module.exit_json(**result)
@@ -1,26 +1,13 @@
-import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
 def main():
-    module_args = dict(
+    idrac_module.run_simple(
+        {},
+        lambda api, params: api.reset_manager(),
+        changed=True,
     )
 
-    module = idrac_module.IDRACModule(
-        argument_spec=module_args,
-        supports_check_mode=True,
-    )
-
-    result = dict(
-        changed=False,
-    )
-
-    module.api.reset_manager()
-
-    result['changed'] = True
-
-    module.exit_json(**result)
-
 
 if __name__ == '__main__':
     main()
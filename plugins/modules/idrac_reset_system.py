@@ -2,20 +2,25 @@ import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        reset_type=dict(type='str', required=True),
-    )
+MODULE_ARGS = dict(
+    reset_type=dict(type='str', required=True),
+)
+
 
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
-        supports_check_mode=False,
+        argument_spec=MODULE_ARGS,
+        supports_check_mode=True,
     )
 
     result = dict(
         changed=False,
     )
 
+    if module.check_mode:
+        result['changed'] = True
+        module.exit_json(**result)
+
     try:
         module.api.reset_system(module.params['reset_type'])
     except idrac.OperationFailed as err:
@@ -1,29 +1,18 @@
-import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        uri=dict(type='str', required=True)
-    )
+MODULE_ARGS = dict(
+    uri=dict(type='str', required=True)
+)
 
-    module = idrac_module.IDRACModule(
-        argument_spec=module_args,
-        supports_check_mode=True,
-    )
 
-    result = dict(
-        changed=False,
+def main():
+    idrac_module.run_simple(
+        MODULE_ARGS,
+        lambda api, params: api.get_cached(params['uri']),
+        result_key='resource',
     )
 
-    resource = module.api.get(module.params['uri'])
-
-    result['idrac'] = {
-        'resource': resource,
-    }
-
-    module.exit_json(**result)
-
 
 if __name__ == '__main__':
     main()
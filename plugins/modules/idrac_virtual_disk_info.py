@@ -1,15 +1,15 @@
-import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        disk=dict(type='dict'),
-        disk_id=dict(type='str'),
-    )
+MODULE_ARGS = dict(
+    disk=dict(type='dict'),
+    disk_id=dict(type='str'),
+)
+
 
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
+        argument_spec=MODULE_ARGS,
         supports_check_mode=True,
     )
 
@@ -25,6 +25,14 @@ def main():
         module.fail_json(
             msg='you must provide one of disk or disk_id')
 
+    if module.check_mode:
+        result['idrac'] = {
+            'disk': {
+                'id': did,
+            }
+        }
+        module.exit_json(**result)
+
     disk = module.api.get_virtual_disk(did)
 
     result['idrac'] = {
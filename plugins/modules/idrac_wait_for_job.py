@@ -2,16 +2,18 @@ import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac as idrac
 import ansible_collections.moc.idrac.plugins.module_utils.dell_idrac_module as idrac_module
 
 
-def main():
-    module_args = dict(
-        job=dict(type='dict'),
-        job_id=dict(type='str'),
-        state=dict(type='str', required=True),
-        timeout=dict(type='int'),
-    )
+MODULE_ARGS = dict(
+    job=dict(type='dict'),
+    job_id=dict(type='str'),
+    state=dict(type='str', required=True,
+               choices=list(idrac.JOB_STATE.__members__)),
+    timeout=dict(type='int'),
+)
+
 
+def main():
     module = idrac_module.IDRACModule(
-        argument_spec=module_args,
+        argument_spec=MODULE_ARGS,
         supports_check_mode=True,
     )
 
@@ -27,16 +29,27 @@ def main():
         module.fail_json(
             msg='you must provide one of job or job_id')
 
+    if module.check_mode:
+        result['idrac'] = {
+            'job': {
+                'id': jid,
+            }
+        }
+        module.exit_json(**result)
+
     try:
-        module.api.wait_for_job_state(
+        job = module.api.wait_for_job_state_sse(
             jid,
-            getattr(idrac.JOB_STATE, module.params['state']),
+            idrac.JOB_STATE[module.params['state']],
             timeout=module.params['timeout'],
         )
-    except TimeoutError:
+    except (TimeoutError, idrac.RequestTimeout):
         module.fail_json(msg='Timeout waiting for job')
+    except idrac.UnexpectedJobState as err:
+        module.fail_json(msg=str(err), job=err.job)
+    except idrac.OperationFailed as err:
+        module.fail_json(msg=str(err), errors=err.errors)
 
-    job = module.api.get_job(jid)
     result['idrac'] = {
         'job': job,
     }